@@ -1,24 +1,38 @@
 import logging
 import discord
 from discord.ext import tasks
-from config import TOKEN, GUILD_ID, TARGET_CHANNELS, CHECK_INTERVAL_HOURS, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, TEST_MODE
-from cleanup import process_channel
+from config import TOKEN, GUILD_ID, TARGET_CHANNELS, CHECK_INTERVAL_HOURS, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, TEST_MODE, LOW_MEMORY_MODE
+from cleanup import process_channel, close_http_session
 from database import init_db, close_db
+from policies import reload_policies
 from logging_config import setup_logging
 
 # Setup logging before creating logger
 setup_logging(log_file=LOG_FILE, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT)
 _logger = logging.getLogger(__name__)
 
-intents = discord.Intents.default()
-intents.message_content = True
+if LOW_MEMORY_MODE:
+    # History is read over REST, so only guild/channel data is needed from the gateway.
+    # message_content is still required for attachments to be included in history.
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.message_content = True
+    bot = discord.Client(
+        intents=intents,
+        max_messages=None,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+    )
+else:
+    intents = discord.Intents.default()
+    intents.message_content = True
 
-bot = discord.Client(intents=intents)
+    bot = discord.Client(intents=intents)
 
 
 @bot.event
 async def on_ready():
-    _logger.info("Logged in as %s (TEST_MODE=%s)", bot.user, TEST_MODE)
+    _logger.info("Logged in as %s (TEST_MODE=%s, LOW_MEMORY_MODE=%s)", bot.user, TEST_MODE, LOW_MEMORY_MODE)
     await init_db()
 
     guild = bot.get_guild(GUILD_ID)
@@ -43,6 +57,7 @@ async def on_ready():
 @tasks.loop(hours=CHECK_INTERVAL_HOURS)
 async def cleanup_loop():
     _logger.info("Running scheduled cleanup...")
+    reload_policies()
     guild = bot.get_guild(GUILD_ID)
 
     for channel_id in TARGET_CHANNELS:
@@ -64,6 +79,10 @@ async def on_disconnect():
         await close_db()
     except Exception:
         _logger.exception("Error while closing database")
+    try:
+        await close_http_session()
+    except Exception:
+        _logger.exception("Error while closing HTTP session")
 
 
 bot.run(TOKEN)
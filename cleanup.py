@@ -2,17 +2,105 @@ import asyncio
 import os
 import re
 import logging
+import aiohttp
 import discord
+from typing import NamedTuple, Optional, Tuple
 from uuid import uuid4
 from pathlib import Path
-from datetime import datetime, timedelta, timezone
-from config import DAYS_OLD, ARCHIVE_FOLDER, TEST_MODE, MAX_ARCHIVE_SIZE_MB, FILE_TYPES
-from database import insert_record, mark_deleted, get_channel_state, upsert_channel_state
+from datetime import datetime, timezone
+from config import ARCHIVE_FOLDER, TEST_MODE, MAX_ARCHIVE_SIZE_MB, LOW_MEMORY_MODE
+from policies import get_policy
+from database import (
+    insert_record,
+    mark_deleted,
+    get_channel_state,
+    upsert_channel_state,
+    get_dry_run_state,
+    upsert_dry_run_state,
+    clear_dry_run_state,
+    insert_dry_run_deletion,
+    get_dry_run_deletions,
+    remove_dry_run_deletion,
+)
 
 _logger = logging.getLogger(__name__)
 
 _SAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._-]")
 BATCH_SIZE = 200
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_http_session = None
+
+
+class CompactAttachment(NamedTuple):
+    id: Optional[int]
+    filename: str
+    size: int
+    url: str
+
+
+class CompactMessage:
+    """The parts of a discord.Message that process_channel needs, used in LOW_MEMORY_MODE."""
+
+    __slots__ = ("id", "created_at", "pinned", "attachments")
+
+    def __init__(self, id: int, created_at: datetime, pinned: bool, attachments: Tuple[CompactAttachment, ...]):
+        self.id = id
+        self.created_at = created_at
+        self.pinned = pinned
+        self.attachments = attachments
+
+
+def compact_message(message) -> CompactMessage:
+    """Reduce a discord.Message to a CompactMessage so the full object can be freed."""
+    return CompactMessage(
+        message.id,
+        message.created_at,
+        message.pinned,
+        tuple(
+            CompactAttachment(getattr(a, "id", None), a.filename, a.size, a.url)
+            for a in message.attachments
+        ),
+    )
+
+
+async def _get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession()
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session:
+        await _http_session.close()
+        _http_session = None
+
+
+async def save_attachment(attachment, file_path: Path) -> None:
+    """Save a discord.Attachment or CompactAttachment to file_path.
+
+    Compact attachments are streamed from their CDN URL into a ``.part`` file that
+    is renamed into place once complete. verify_archive.py ignores leftover
+    ``.part`` files from interrupted downloads.
+    """
+    if not isinstance(attachment, CompactAttachment):
+        await attachment.save(str(file_path))
+        return
+
+    session = await _get_http_session()
+    part_path = file_path.with_name(file_path.name + ".part")
+    try:
+        async with session.get(attachment.url) as resp:
+            resp.raise_for_status()
+            with open(part_path, "wb") as fh:
+                async for chunk in resp.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                    fh.write(chunk)
+        os.replace(part_path, file_path)
+    finally:
+        if part_path.exists():
+            part_path.unlink()
 
 
 def sanitize_filename(filename: str) -> str:
@@ -60,8 +148,67 @@ def prune_archive(base_path: Path, max_bytes: int) -> int:
     return freed
 
 
+async def replay_dry_run_deletions(channel, policy=None) -> int:
+    """Delete messages recorded by earlier TEST_MODE runs and promote the dry-run cursor.
+
+    Messages are deleted by ID without re-reading channel history. Each entry is
+    re-checked against the channel's current retention policy: entries newer than
+    its cutoff stay queued until they age out, and pinned messages are dropped when
+    the policy exempts them. Entries that fail to delete stay pending and are
+    retried on the next run.
+
+    Returns number of messages deleted.
+    """
+    policy = policy or get_policy(channel.id)
+    cutoff = policy.cutoff()
+    deleted = 0
+    pending = await get_dry_run_deletions(channel.id)
+    if pending:
+        perms = channel.permissions_for(channel.guild.me)
+        if not perms.manage_messages:
+            _logger.warning("Missing manage_messages permission in channel %s; keeping %d pending dry-run deletions", channel.id, len(pending))
+        else:
+            for message_id, created_at in pending:
+                # queue is ordered by message ID, i.e. by creation time
+                if created_at and datetime.fromisoformat(created_at) >= cutoff:
+                    break
+                try:
+                    if policy.exempt_pinned:
+                        message = await channel.fetch_message(message_id)
+                        if message.pinned:
+                            _logger.info("Message %s is pinned; dropping pending dry-run deletion", message_id)
+                            await remove_dry_run_deletion(message_id)
+                            continue
+                    await channel.get_partial_message(message_id).delete()
+                    deleted += 1
+                    _logger.info("Deleted message %s (replayed from test mode)", message_id)
+                    await asyncio.sleep(0.2)
+                except discord.NotFound:
+                    _logger.debug("Message %s already gone; dropping pending dry-run deletion", message_id)
+                except Exception:
+                    _logger.exception("Failed to delete message %s", message_id)
+                    continue
+                await mark_deleted(message_id)
+                await remove_dry_run_deletion(message_id)
+
+    # Everything up to the dry-run cursor has been archived and queued above, so the
+    # live scan can start from there instead of re-reading that history.
+    dry_last, _ = await get_dry_run_state(channel.id)
+    if dry_last:
+        live_last, _ = await get_channel_state(channel.id)
+        if dry_last > (live_last or 0):
+            await upsert_channel_state(channel.id, dry_last, datetime.now(timezone.utc).isoformat())
+        await clear_dry_run_state(channel.id)
+
+    return deleted
+
+
 async def process_channel(channel):
-    cutoff = datetime.now(timezone.utc) - timedelta(days=DAYS_OLD)
+    policy = get_policy(channel.id)
+    if not policy.enabled:
+        _logger.debug("Retention disabled for channel %s; skipping", channel.id)
+        return
+    cutoff = policy.cutoff()
 
     base_archive = Path(ARCHIVE_FOLDER)
     base_archive.mkdir(parents=True, exist_ok=True)
@@ -76,8 +223,30 @@ async def process_channel(channel):
         except Exception:
             _logger.exception("Error while pruning archive %s", base_archive)
 
-    # Use incremental scanning: read last processed message id for this channel and page forward
-    last_message_id, _ = await get_channel_state(channel.id)
+    # enforce the channel's own archive quota from its retention policy
+    if policy.max_archive_bytes > 0:
+        channel_archive = base_archive / str(channel.id)
+        try:
+            freed = prune_archive(channel_archive, policy.max_archive_bytes)
+            if freed:
+                _logger.info("Pruned archive %s freed %d bytes", channel_archive, freed)
+        except Exception:
+            _logger.exception("Error while pruning archive %s", channel_archive)
+
+    # Use incremental scanning: read last processed message id for this channel and page forward.
+    # TEST_MODE keeps its own cursor so switching to live mode still deletes what it saw.
+    if TEST_MODE:
+        dry_last, _ = await get_dry_run_state(channel.id)
+        live_last, _ = await get_channel_state(channel.id)
+        last_message_id = max(dry_last or 0, live_last or 0) or None
+    else:
+        try:
+            replayed = await replay_dry_run_deletions(channel, policy)
+            if replayed:
+                _logger.info("Replayed %d dry-run deletions for channel %s", replayed, channel.id)
+        except Exception:
+            _logger.exception("Error while replaying dry-run deletions for channel %s", channel.id)
+        last_message_id, _ = await get_channel_state(channel.id)
     after = discord.Object(id=last_message_id) if last_message_id else None
     processed_max = last_message_id or 0
 
@@ -85,7 +254,7 @@ async def process_channel(channel):
         batch = []
         batch_start = datetime.now(timezone.utc)
         async for message in channel.history(limit=BATCH_SIZE, after=after, before=cutoff, oldest_first=True):
-            batch.append(message)
+            batch.append(compact_message(message) if LOW_MEMORY_MODE else message)
 
         if not batch:
             break
@@ -95,12 +264,12 @@ async def process_channel(channel):
 
         for message in batch:
             try:
-                if not message.attachments:
+                if not message.attachments or not policy.wants_message(message):
                     continue
 
                 for attachment in message.attachments:
                     filename = attachment.filename or "attachment"
-                    if not filename.lower().endswith(FILE_TYPES):
+                    if not policy.wants_attachment(filename):
                         continue
 
                     # sanitize and uniquify filename
@@ -119,19 +288,26 @@ async def process_channel(channel):
 
                     try:
                         if not file_path.exists():
-                            await attachment.save(str(file_path))
+                            await save_attachment(attachment, file_path)
                     except Exception:
                         _logger.exception("Failed to save attachment %s from message %s", filename, message.id)
                         continue
 
+                    try:
+                        file_size = file_path.stat().st_size
+                    except OSError:
+                        file_size = None
+
                     await insert_record(
                         message.id,
                         channel.id,
                         message.created_at.isoformat(),
                         str(file_path),
+                        file_size,
                     )
 
                     if TEST_MODE:
+                        await insert_dry_run_deletion(message.id, channel.id, message.created_at.isoformat())
                         _logger.info("[TEST MODE] Would delete message %s", message.id)
                     else:
                         # permission check
@@ -141,7 +317,7 @@ async def process_channel(channel):
                             continue
 
                         try:
-                            await message.delete()
+                            await channel.get_partial_message(message.id).delete()
                             await mark_deleted(message.id)
                             _logger.info("Deleted message %s", message.id)
                             await asyncio.sleep(0.2)
@@ -165,10 +341,14 @@ async def process_channel(channel):
         last_message_id = processed_max
         after = discord.Object(id=processed_max)
 
-        # Only persist channel state when we actually deleted messages. In TEST_MODE do not
-        # persist, so a later run with TEST_MODE=false will re-scan and delete those messages.
-        if not TEST_MODE and processed_max and processed_max != prev_last:
-            await upsert_channel_state(channel.id, processed_max, datetime.now(timezone.utc).isoformat())
+        # In TEST_MODE persist to the separate dry-run cursor; the messages that would have
+        # been deleted are queued in dry_run_deletions and replayed once TEST_MODE is off.
+        if processed_max and processed_max != prev_last:
+            now = datetime.now(timezone.utc).isoformat()
+            if TEST_MODE:
+                await upsert_dry_run_state(channel.id, processed_max, now)
+            else:
+                await upsert_channel_state(channel.id, processed_max, now)
 
         batch_duration = (datetime.now(timezone.utc) - batch_start).total_seconds()
         _logger.info(
@@ -90,3 +90,9 @@ LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 # File type management
 FILE_TYPES = MANAGED_EXTENSIONS
 
+# Low-memory mode: reduce history to compact records and disable client caches
+LOW_MEMORY_MODE = _get_bool_env("LOW_MEMORY_MODE", default=False)
+
+# Optional JSON file with per-channel retention policies (see policies.py)
+RETENTION_POLICIES_FILE = os.getenv("RETENTION_POLICIES_FILE") or None
+
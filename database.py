@@ -12,10 +12,18 @@ CREATE TABLE IF NOT EXISTS tracked_images (
     channel_id INTEGER,
     created_at TEXT,
     file_path TEXT,
-    deleted INTEGER DEFAULT 0
+    deleted INTEGER DEFAULT 0,
+    file_size INTEGER,
+    sha256 TEXT
 );
 """
 
+# Columns added after the initial schema; created on existing databases by init_db().
+TRACKED_IMAGES_ADDED_COLUMNS = (
+    ("file_size", "INTEGER"),
+    ("sha256", "TEXT"),
+)
+
 CREATE_CHANNEL_STATE_SQL = """
 CREATE TABLE IF NOT EXISTS channel_state (
     channel_id INTEGER PRIMARY KEY,
@@ -24,6 +32,26 @@ CREATE TABLE IF NOT EXISTS channel_state (
 );
 """
 
+CREATE_DRY_RUN_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS dry_run_state (
+    channel_id INTEGER PRIMARY KEY,
+    last_message_id INTEGER,
+    last_processed_at TEXT
+);
+"""
+
+CREATE_DRY_RUN_DELETIONS_SQL = """
+CREATE TABLE IF NOT EXISTS dry_run_deletions (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER,
+    created_at TEXT
+);
+"""
+
+CREATE_DRY_RUN_DELETIONS_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_dry_run_deletions_channel ON dry_run_deletions (channel_id, message_id);
+"""
+
 _db = None
 
 def _ensure_database_path(db_path: str) -> None:
@@ -50,7 +78,15 @@ async def init_db():
     _ensure_database_path(DATABASE_FILE)
     _db = await aiosqlite.connect(DATABASE_FILE)
     await _db.execute(CREATE_TABLE_SQL)
+    cur = await _db.execute("PRAGMA table_info(tracked_images)")
+    existing = {row[1] for row in await cur.fetchall()}
+    for name, col_type in TRACKED_IMAGES_ADDED_COLUMNS:
+        if name not in existing:
+            await _db.execute(f"ALTER TABLE tracked_images ADD COLUMN {name} {col_type}")
     await _db.execute(CREATE_CHANNEL_STATE_SQL)
+    await _db.execute(CREATE_DRY_RUN_STATE_SQL)
+    await _db.execute(CREATE_DRY_RUN_DELETIONS_SQL)
+    await _db.execute(CREATE_DRY_RUN_DELETIONS_INDEX_SQL)
     await _db.commit()
     _logger.info("Database initialized at %s", DATABASE_FILE)
 
@@ -60,14 +96,14 @@ async def close_db():
         await _db.close()
         _db = None
 
-async def insert_record(message_id, channel_id, created_at, file_path):
+async def insert_record(message_id, channel_id, created_at, file_path, file_size=None):
     global _db
     if not _db:
         raise RuntimeError("Database not initialized. Call init_db() first.")
     try:
         await _db.execute(
-            "INSERT OR IGNORE INTO tracked_images (message_id, channel_id, created_at, file_path, deleted) VALUES (?, ?, ?, ?, 0)",
-            (message_id, channel_id, created_at, file_path),
+            "INSERT OR IGNORE INTO tracked_images (message_id, channel_id, created_at, file_path, deleted, file_size) VALUES (?, ?, ?, ?, 0, ?)",
+            (message_id, channel_id, created_at, file_path, file_size),
         )
         await _db.commit()
     except Exception as e:
@@ -119,3 +155,91 @@ async def mark_deleted(message_id):
         await _db.commit()
     except Exception as e:
         _logger.exception("Failed to mark message %s deleted: %s", message_id, e)
+
+
+async def get_dry_run_state(channel_id):
+    """Return (last_message_id, last_processed_at) of the TEST_MODE cursor for a channel, or (None, None)."""
+    global _db
+    if not _db:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    try:
+        cur = await _db.execute(
+            "SELECT last_message_id, last_processed_at FROM dry_run_state WHERE channel_id=?",
+            (channel_id,),
+        )
+        row = await cur.fetchone()
+        if row:
+            return row[0], row[1]
+        return None, None
+    except Exception as e:
+        _logger.exception("Failed to get dry-run state for %s: %s", channel_id, e)
+        return None, None
+
+
+async def upsert_dry_run_state(channel_id, last_message_id, last_processed_at):
+    global _db
+    if not _db:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    try:
+        await _db.execute(
+            "INSERT INTO dry_run_state (channel_id, last_message_id, last_processed_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(channel_id) DO UPDATE SET last_message_id=excluded.last_message_id, last_processed_at=excluded.last_processed_at",
+            (channel_id, last_message_id, last_processed_at),
+        )
+        await _db.commit()
+    except Exception as e:
+        _logger.exception("Failed to upsert dry-run state for %s: %s", channel_id, e)
+
+
+async def clear_dry_run_state(channel_id):
+    global _db
+    if not _db:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    try:
+        await _db.execute("DELETE FROM dry_run_state WHERE channel_id=?", (channel_id,))
+        await _db.commit()
+    except Exception as e:
+        _logger.exception("Failed to clear dry-run state for %s: %s", channel_id, e)
+
+
+async def insert_dry_run_deletion(message_id, channel_id, created_at):
+    """Record a message that TEST_MODE would have deleted, for replay in live mode."""
+    global _db
+    if not _db:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    try:
+        await _db.execute(
+            "INSERT OR IGNORE INTO dry_run_deletions (message_id, channel_id, created_at) VALUES (?, ?, ?)",
+            (message_id, channel_id, created_at),
+        )
+        await _db.commit()
+    except Exception as e:
+        _logger.exception("Failed to insert dry-run deletion for message %s: %s", message_id, e)
+
+
+async def get_dry_run_deletions(channel_id):
+    """Return (message_id, created_at) pending deletion from earlier TEST_MODE runs, oldest first."""
+    global _db
+    if not _db:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    try:
+        cur = await _db.execute(
+            "SELECT message_id, created_at FROM dry_run_deletions WHERE channel_id=? ORDER BY message_id",
+            (channel_id,),
+        )
+        rows = await cur.fetchall()
+        return [(row[0], row[1]) for row in rows]
+    except Exception as e:
+        _logger.exception("Failed to get dry-run deletions for %s: %s", channel_id, e)
+        return []
+
+
+async def remove_dry_run_deletion(message_id):
+    global _db
+    if not _db:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    try:
+        await _db.execute("DELETE FROM dry_run_deletions WHERE message_id=?", (message_id,))
+        await _db.commit()
+    except Exception as e:
+        _logger.exception("Failed to remove dry-run deletion for message %s: %s", message_id, e)
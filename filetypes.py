@@ -4,7 +4,7 @@ Supports selecting which file types are archived.
 """
 
 import os
-from typing import Tuple
+from typing import Iterable, Tuple
 
 # All supported file types, organized by category
 SUPPORTED_TYPES = {
@@ -48,9 +48,18 @@ class FileTypeManager:
 
         # Parse comma-separated categories
         requested = [t.strip() for t in managed_types.split(",") if t.strip()]
+        return FileTypeManager.resolve_extensions(requested)
+
+    @staticmethod
+    def resolve_extensions(categories: Iterable[str]) -> Tuple[str, ...]:
+        """Return the extensions for the given category names.
+
+        Raises ValueError for unknown categories.
+        """
         extensions = []
 
-        for req in requested:
+        for req in categories:
+            req = req.strip().lower()
             if req not in SUPPORTED_TYPES:
                 raise ValueError(
                     f"Unknown file type category: {req}. "
@@ -0,0 +1,209 @@
+"""Per-channel retention policies for the discord-image-cleaner.
+
+Policies are read from the JSON file named by RETENTION_POLICIES_FILE and compiled
+once into ChannelPolicy objects whose predicates are evaluated per message, so
+process_channel does no config lookups while walking history. Without a policy
+file every channel uses DAYS_OLD, MANAGED_FILE_TYPES and no per-channel quota.
+
+Example file:
+    {
+        "default": {"days_old": 30},
+        "channels": {
+            "111111111111111111": {"days_old": 1, "max_archive_size_mb": 500},
+            "222222222222222222": {"enabled": false},
+            "333333333333333333": {"file_types": ["images"], "exempt_pinned": true}
+        }
+    }
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+from config import DAYS_OLD, FILE_TYPES, RETENTION_POLICIES_FILE
+from filetypes import FileTypeManager
+
+_logger = logging.getLogger(__name__)
+
+_POLICY_KEYS = frozenset({"enabled", "days_old", "file_types", "max_archive_size_mb", "exempt_pinned"})
+
+
+def _compile_attachment_predicate(extensions: Tuple[str, ...]) -> Callable[[Optional[str]], bool]:
+    def wants_attachment(filename):
+        return (filename or "attachment").lower().endswith(extensions)
+
+    return wants_attachment
+
+
+def _compile_message_predicate(exempt_pinned: bool) -> Callable[[object], bool]:
+    if not exempt_pinned:
+        return lambda message: True
+
+    def wants_message(message):
+        return not getattr(message, "pinned", False)
+
+    return wants_message
+
+
+class ChannelPolicy:
+    """Compiled retention policy for one channel.
+
+    Use wants_message(message) and wants_attachment(filename) as the per-item
+    filters and cutoff() for the end of the history window.
+    """
+
+    __slots__ = (
+        "enabled",
+        "days_old",
+        "extensions",
+        "exempt_pinned",
+        "max_archive_bytes",
+        "wants_message",
+        "wants_attachment",
+        "_retention",
+    )
+
+    def __init__(self, enabled=True, days_old=DAYS_OLD, extensions=FILE_TYPES, exempt_pinned=False, max_archive_bytes=0):
+        self.enabled = enabled
+        self.days_old = days_old
+        self.extensions = extensions
+        self.exempt_pinned = exempt_pinned
+        self.max_archive_bytes = max_archive_bytes
+        self.wants_message = _compile_message_predicate(exempt_pinned)
+        self.wants_attachment = _compile_attachment_predicate(extensions)
+        self._retention = timedelta(days=days_old)
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """Return the timestamp before which messages are eligible for cleanup."""
+        return (now or datetime.now(timezone.utc)) - self._retention
+
+
+class PolicySet:
+    """Compiled policies for all channels, with a fallback for unlisted channels."""
+
+    __slots__ = ("default", "channels")
+
+    def __init__(self, default: ChannelPolicy, channels: Dict[int, ChannelPolicy]):
+        self.default = default
+        self.channels = channels
+
+    def get(self, channel_id: int) -> ChannelPolicy:
+        return self.channels.get(channel_id, self.default)
+
+
+def _compile_policy(name: str, spec: dict, base: ChannelPolicy) -> ChannelPolicy:
+    if not isinstance(spec, dict):
+        raise ValueError(f"Retention policy {name} must be an object")
+    unknown = set(spec) - _POLICY_KEYS
+    if unknown:
+        raise ValueError(f"Unknown retention policy keys for {name}: {', '.join(sorted(unknown))}")
+
+    days_old = spec.get("days_old", base.days_old)
+    if not isinstance(days_old, int) or isinstance(days_old, bool) or days_old <= 0:
+        raise ValueError(f"days_old for {name} must be a positive integer")
+
+    if "file_types" in spec:
+        file_types = spec["file_types"]
+        if not isinstance(file_types, list) or not file_types or not all(isinstance(t, str) for t in file_types):
+            raise ValueError(f"file_types for {name} must be a non-empty list of categories")
+        extensions = FileTypeManager.resolve_extensions(file_types)
+    else:
+        extensions = base.extensions
+
+    if "max_archive_size_mb" in spec:
+        max_mb = spec["max_archive_size_mb"]
+        if not isinstance(max_mb, int) or isinstance(max_mb, bool) or max_mb < 0:
+            raise ValueError(f"max_archive_size_mb for {name} must be a non-negative integer")
+        max_archive_bytes = max_mb * 1024 * 1024
+    else:
+        max_archive_bytes = base.max_archive_bytes
+
+    enabled = spec.get("enabled", base.enabled)
+    if not isinstance(enabled, bool):
+        raise ValueError(f"enabled for {name} must be true or false")
+
+    exempt_pinned = spec.get("exempt_pinned", base.exempt_pinned)
+    if not isinstance(exempt_pinned, bool):
+        raise ValueError(f"exempt_pinned for {name} must be true or false")
+
+    return ChannelPolicy(
+        enabled=enabled,
+        days_old=days_old,
+        extensions=extensions,
+        exempt_pinned=exempt_pinned,
+        max_archive_bytes=max_archive_bytes,
+    )
+
+
+def compile_policies(data: dict) -> PolicySet:
+    """Compile a policy document into a PolicySet.
+
+    Settings missing from "default" fall back to the environment configuration,
+    and settings missing from a channel entry fall back to "default".
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Retention policy file must contain a JSON object")
+    unknown = set(data) - {"default", "channels"}
+    if unknown:
+        raise ValueError(f"Unknown top-level retention policy keys: {', '.join(sorted(unknown))}")
+
+    default = _compile_policy("default", data.get("default", {}), ChannelPolicy())
+    channels = {}
+    specs = data.get("channels", {})
+    if not isinstance(specs, dict):
+        raise ValueError("Retention policy channels must be an object keyed by channel ID")
+    for key, spec in specs.items():
+        try:
+            channel_id = int(key)
+        except ValueError:
+            raise ValueError(f"Retention policy channel key must be a channel ID, got {key!r}")
+        channels[channel_id] = _compile_policy(f"channel {key}", spec, default)
+    return PolicySet(default, channels)
+
+
+def load_policies(path: Optional[str] = RETENTION_POLICIES_FILE) -> PolicySet:
+    """Read and compile the policy file at path (or the defaults if path is None)."""
+    if not path:
+        return compile_policies({})
+    with open(path, "r", encoding="utf-8") as fh:
+        return compile_policies(json.load(fh))
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+# Load on module import so a broken policy file fails at startup
+_policies_mtime = _mtime(RETENTION_POLICIES_FILE)
+_policies = load_policies()
+
+
+def get_policy(channel_id: int) -> ChannelPolicy:
+    """Return the compiled policy for a channel."""
+    return _policies.get(channel_id)
+
+
+def reload_policies(path: Optional[str] = RETENTION_POLICIES_FILE) -> bool:
+    """Recompile the policy file if it changed since the last load.
+
+    On a parse or validation error the previous policies stay active.
+    Returns True if new policies were installed.
+    """
+    global _policies, _policies_mtime
+    mtime = _mtime(path)
+    if mtime is None or mtime == _policies_mtime:
+        return False
+    try:
+        policies = load_policies(path)
+    except Exception:
+        _logger.exception("Failed to reload retention policies from %s; keeping previous policies", path)
+        return False
+    _policies, _policies_mtime = policies, mtime
+    _logger.info("Reloaded retention policies from %s (%d channel overrides)", path, len(policies.channels))
+    return True
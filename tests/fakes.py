@@ -0,0 +1,49 @@
+"""Minimal stand-ins for the discord.py channel objects used by cleanup.py."""
+
+from types import SimpleNamespace
+
+import discord
+
+
+class FakePartialMessage:
+    def __init__(self, channel, message_id):
+        self._channel = channel
+        self.id = message_id
+
+    async def delete(self):
+        if self.id in self._channel.missing:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+        self._channel.deleted.append(self.id)
+
+
+class FakeChannel:
+    """A text channel serving `messages` from history and recording deletes.
+
+    Message IDs in `missing` raise NotFound on delete; IDs in `pinned` come back
+    pinned from fetch_message. The `after` cursor of each history() call is kept in
+    `history_after`.
+    """
+
+    def __init__(self, channel_id, messages=(), missing=(), pinned=()):
+        self.id = channel_id
+        self.guild = SimpleNamespace(me=object())
+        self.messages = list(messages)
+        self.missing = set(missing)
+        self.pinned = set(pinned)
+        self.deleted = []
+        self.history_after = []
+
+    def permissions_for(self, member):
+        return SimpleNamespace(manage_messages=True)
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self, message_id)
+
+    async def fetch_message(self, message_id):
+        return SimpleNamespace(id=message_id, pinned=message_id in self.pinned)
+
+    async def history(self, limit, after=None, before=None, oldest_first=True):
+        self.history_after.append(after.id if after else None)
+        for message in self.messages:
+            if after is None or message.id > after.id:
+                yield message
@@ -0,0 +1,105 @@
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# ensure required env vars for config when importing modules
+os.environ.update({
+    "DISCORD_TOKEN": "dummy",
+    "GUILD_ID": "123",
+    "TARGET_CHANNELS": "123",
+    "TEST_MODE": "true",
+})
+
+from cleanup import compact_message, CompactAttachment
+from fakes import FakeChannel
+
+
+def test_compact_message():
+    created = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    message = SimpleNamespace(
+        id=5555,
+        created_at=created,
+        pinned=False,
+        content="not kept",
+        attachments=[
+            SimpleNamespace(id=1, filename="a.png", size=10, url="https://cdn.example/a.png", proxy_url="x"),
+            SimpleNamespace(filename="b.jpg", size=20, url="https://cdn.example/b.jpg"),
+        ],
+    )
+    compact = compact_message(message)
+    assert compact.id == 5555
+    assert compact.created_at == created
+    assert compact.pinned is False
+    assert compact.attachments == (
+        CompactAttachment(1, "a.png", 10, "https://cdn.example/a.png"),
+        CompactAttachment(None, "b.jpg", 20, "https://cdn.example/b.jpg"),
+    )
+    assert not hasattr(compact, "__dict__")
+
+
+def test_process_channel_low_memory(tmp_path, monkeypatch):
+    import asyncio
+    import aiosqlite
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    import cleanup
+    import database
+
+    payload = b"\x89PNG" + b"x" * 200_000
+
+    async def _image(request):
+        return web.Response(body=payload)
+
+    db_path = str(tmp_path / "image_tracker_low_memory.db")
+    monkeypatch.setattr(database, "DATABASE_FILE", db_path)
+    monkeypatch.setattr(cleanup, "ARCHIVE_FOLDER", str(tmp_path / "archive"))
+    monkeypatch.setattr(cleanup, "TEST_MODE", False)
+    monkeypatch.setattr(cleanup, "LOW_MEMORY_MODE", True)
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(cleanup.asyncio, "sleep", lambda *_: real_sleep(0))
+
+    saved = []
+    real_save = cleanup.save_attachment
+
+    async def _recording_save(attachment, file_path):
+        saved.append(attachment)
+        await real_save(attachment, file_path)
+
+    monkeypatch.setattr(cleanup, "save_attachment", _recording_save)
+
+    async def _run():
+        app = web.Application()
+        app.router.add_get("/a.png", _image)
+        server = TestServer(app)
+        await server.start_server()
+        await database.init_db()
+        try:
+            created = datetime(2020, 1, 1, tzinfo=timezone.utc)
+            message = SimpleNamespace(
+                id=5555,
+                created_at=created,
+                pinned=False,
+                attachments=[SimpleNamespace(id=1, filename="a.png", size=len(payload), url=str(server.make_url("/a.png")))],
+            )
+            channel = FakeChannel(42, messages=[message])
+            await cleanup.process_channel(channel)
+        finally:
+            await cleanup.close_http_session()
+            await database.close_db()
+            await server.close()
+
+        async with aiosqlite.connect(db_path) as conn:
+            cur = await conn.execute("SELECT file_path, file_size, deleted FROM tracked_images WHERE message_id=5555")
+            row = await cur.fetchone()
+        return channel, row
+
+    channel, row = asyncio.run(_run())
+
+    assert len(saved) == 1 and isinstance(saved[0], CompactAttachment)
+    assert channel.deleted == [5555]
+    file_path, file_size, deleted = row
+    assert file_path.endswith("5555_1_a.png")
+    assert open(file_path, "rb").read() == payload
+    assert file_size == len(payload)
+    assert deleted == 1
+    assert not list((tmp_path / "archive").glob("**/*.part"))
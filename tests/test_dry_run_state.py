@@ -0,0 +1,130 @@
+import os
+import importlib
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fakes import FakeChannel
+
+
+class _FakeAttachment:
+    def __init__(self, attachment_id, filename):
+        self.id = attachment_id
+        self.filename = filename
+
+    async def save(self, path):
+        with open(path, "wb") as fh:
+            fh.write(b"x" * 10)
+
+
+def _message(message_id):
+    return SimpleNamespace(
+        id=message_id,
+        created_at=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        pinned=False,
+        attachments=[_FakeAttachment(message_id + 1, "a.png")],
+    )
+
+
+def _setup(tmp_path, name):
+    os.environ.update({
+        "DISCORD_TOKEN": "dummy",
+        "GUILD_ID": "123",
+        "TARGET_CHANNELS": "123",
+        "TEST_MODE": "true",
+        "DATABASE_FILE": str(tmp_path / name),
+    })
+
+    import config as _config
+    importlib.reload(_config)
+    db = importlib.import_module("database")
+    importlib.reload(db)
+    cleanup = importlib.import_module("cleanup")
+    importlib.reload(cleanup)
+    return db, cleanup
+
+
+def test_dry_run_replay(tmp_path, monkeypatch):
+    db, cleanup = _setup(tmp_path, "image_tracker_dry_run.db")
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(cleanup.asyncio, "sleep", lambda *_: real_sleep(0))
+
+    async def _run():
+        await db.init_db()
+        try:
+            await db.upsert_channel_state(42, 100, "2020-01-01T00:00:00Z")
+            await db.upsert_dry_run_state(42, 500, "2020-01-02T00:00:00Z")
+            for message_id in (200, 300, 400):
+                await db.insert_dry_run_deletion(message_id, 42, "2020-01-01T00:00:00+00:00")
+            await db.insert_dry_run_deletion(900, 43, "2020-01-01T00:00:00+00:00")
+
+            channel = FakeChannel(42, missing={300})
+            deleted = await cleanup.replay_dry_run_deletions(channel)
+            assert deleted == 2
+            assert channel.deleted == [200, 400]
+
+            assert await db.get_dry_run_deletions(42) == []
+            assert await db.get_dry_run_deletions(43) == [(900, "2020-01-01T00:00:00+00:00")]
+            lm, _ = await db.get_channel_state(42)
+            assert lm == 500
+            assert await db.get_dry_run_state(42) == (None, None)
+        finally:
+            await db.close_db()
+
+    asyncio.run(_run())
+
+
+def test_dry_run_replay_rechecks_policy(tmp_path, monkeypatch):
+    from policies import ChannelPolicy
+
+    db, cleanup = _setup(tmp_path, "image_tracker_dry_run_policy.db")
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(cleanup.asyncio, "sleep", lambda *_: real_sleep(0))
+    now = datetime.now(timezone.utc).isoformat()
+
+    async def _run():
+        await db.init_db()
+        try:
+            await db.insert_dry_run_deletion(200, 42, "2020-01-01T00:00:00+00:00")
+            await db.insert_dry_run_deletion(300, 42, "2020-01-01T00:00:00+00:00")
+            # queued during a dry run but not old enough under the current policy
+            await db.insert_dry_run_deletion(400, 42, now)
+
+            channel = FakeChannel(42, pinned={300})
+            policy = ChannelPolicy(days_old=30, exempt_pinned=True)
+            deleted = await cleanup.replay_dry_run_deletions(channel, policy)
+            assert deleted == 1
+            assert channel.deleted == [200]
+            assert await db.get_dry_run_deletions(42) == [(400, now)]
+        finally:
+            await db.close_db()
+
+    asyncio.run(_run())
+
+
+def test_process_channel_test_mode_is_incremental(tmp_path, monkeypatch):
+    db, cleanup = _setup(tmp_path, "image_tracker_dry_run_incremental.db")
+    monkeypatch.setattr(cleanup, "ARCHIVE_FOLDER", str(tmp_path / "archive"))
+    monkeypatch.setattr(cleanup, "TEST_MODE", True)
+    monkeypatch.setattr(cleanup, "LOW_MEMORY_MODE", False)
+
+    async def _run():
+        await db.init_db()
+        try:
+            channel = FakeChannel(42, messages=[_message(1000), _message(2000)])
+            await cleanup.process_channel(channel)
+            assert channel.history_after == [None]
+            assert (await db.get_dry_run_state(42))[0] == 2000
+
+            channel.messages.append(_message(3000))
+            await cleanup.process_channel(channel)
+            assert channel.history_after == [None, 2000]
+
+            assert [m for m, _ in await db.get_dry_run_deletions(42)] == [1000, 2000, 3000]
+            assert (await db.get_dry_run_state(42))[0] == 3000
+            assert await db.get_channel_state(42) == (None, None)
+            assert channel.deleted == []
+        finally:
+            await db.close_db()
+
+    asyncio.run(_run())
@@ -0,0 +1,79 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+# ensure required env vars for config when importing modules
+os.environ.update({
+    "DISCORD_TOKEN": "dummy",
+    "GUILD_ID": "123",
+    "TARGET_CHANNELS": "123",
+    "TEST_MODE": "true",
+})
+
+import policies
+from policies import compile_policies, reload_policies, get_policy
+
+
+def test_compile_policies():
+    compiled = compile_policies({
+        "default": {"days_old": 30},
+        "channels": {
+            "1": {"days_old": 1, "max_archive_size_mb": 5},
+            "2": {"enabled": False},
+            "3": {"file_types": ["images"], "exempt_pinned": True},
+        },
+    })
+    now = datetime(2020, 1, 31, tzinfo=timezone.utc)
+
+    assert compiled.get(1).cutoff(now) == now - timedelta(days=1)
+    assert compiled.get(1).max_archive_bytes == 5 * 1024 * 1024
+    assert compiled.get(99).cutoff(now) == now - timedelta(days=30)
+    assert compiled.get(2).enabled is False
+    assert compiled.get(2).days_old == 30
+
+    meme = compiled.get(1)
+    assert meme.wants_attachment("A.PNG")
+    assert not meme.wants_attachment("notes.txt")
+    assert meme.wants_message(SimpleNamespace(pinned=True))
+
+    pinned_exempt = compiled.get(3)
+    assert not pinned_exempt.wants_message(SimpleNamespace(pinned=True))
+    assert pinned_exempt.wants_message(SimpleNamespace(pinned=False))
+
+
+@pytest.mark.parametrize("data", [
+    {"channels": {"1": {"days_old": 0}}},
+    {"channels": {"1": {"file_types": ["videos"]}}},
+    {"channels": {"1": {"days": 3}}},
+    {"channels": {"general": {}}},
+    {"channels": {"1": {"file_types": [5]}}},
+    {"channels": {"1": {"enabled": "false"}}},
+    {"channels": {"1": {"exempt_pinned": "no"}}},
+    {"default": {"enabled": 0}},
+    None,
+    [],
+    0,
+    False,
+])
+def test_compile_policies_rejects_invalid(data):
+    with pytest.raises(ValueError):
+        compile_policies(data)
+
+
+def test_reload_policies(tmp_path, monkeypatch):
+    monkeypatch.setattr(policies, "_policies", policies._policies)
+    monkeypatch.setattr(policies, "_policies_mtime", policies._policies_mtime)
+    path = tmp_path / "policies.json"
+    path.write_text(json.dumps({"channels": {"7": {"days_old": 2}}}))
+    assert reload_policies(str(path))
+    assert get_policy(7).days_old == 2
+    assert not reload_policies(str(path))
+
+    # a broken file keeps the previous policies active
+    path.write_text("{not json")
+    os.utime(path, (0, 0))
+    assert not reload_policies(str(path))
+    assert get_policy(7).days_old == 2
@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+
+# ensure required env vars for config when importing modules
+os.environ.update({
+    "DISCORD_TOKEN": "dummy",
+    "GUILD_ID": "123",
+    "TARGET_CHANNELS": "123",
+    "TEST_MODE": "true",
+})
+
+from database import CREATE_TABLE_SQL
+import verify_archive as verify_archive_module
+from verify_archive import verify_archive, parse_archive_path, iter_archive_files
+
+
+def test_parse_archive_path(tmp_path):
+    base = str(tmp_path)
+    assert parse_archive_path(base, os.path.join(base, "42", "2020-01-01", "100_7_a.png")) == (100, 42, "2020-01-01")
+    assert parse_archive_path(base, os.path.join(base, "42", "notes.txt")) == (None, None, None)
+    assert parse_archive_path(base, os.path.join(base, "42", "2020-01-01", "a.png")) == (None, None, None)
+    assert parse_archive_path(base, os.path.join(base, "42", "2020-01-01", "100_7_a.png.part")) == (None, None, None)
+
+
+def test_verify_archive(tmp_path):
+    base = tmp_path / "archive"
+    day = base / "42" / "2020-01-01"
+    day.mkdir(parents=True)
+    ok = day / "100_1_ok.png"
+    ok.write_bytes(b"x" * 10)
+    resized = day / "200_2_resized.png"
+    resized.write_bytes(b"x" * 20)
+    orphan = day / "300_3_orphan.png"
+    orphan.write_bytes(b"x" * 30)
+    (base / "stray.txt").write_bytes(b"?")
+
+    db_path = str(tmp_path / "image_tracker_verify.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.executemany(
+        "INSERT INTO tracked_images (message_id, channel_id, created_at, file_path, deleted, file_size) VALUES (?, 42, '2020-01-01', ?, 1, ?)",
+        [
+            (100, str(ok), None),
+            (200, str(resized), 25),
+            (400, str(day / "400_4_gone.png"), 40),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    counts = verify_archive(db_path, str(base), workers=2, chunk_size=2)
+    assert counts["files_scanned"] == 4
+    assert counts["missing"] == 1
+    assert counts["orphan"] == 1
+    assert counts["unrecognised"] == 1
+    assert counts["size_mismatch"] == 1
+
+    counts = verify_archive(db_path, str(base), fix=True, check_hash=True, workers=2, chunk_size=2)
+    assert counts["missing_cleared"] == 1
+    assert counts["orphan_adopted"] == 1
+    assert counts["size_recorded"] == 1
+
+    conn = sqlite3.connect(db_path)
+    rows = dict(conn.execute("SELECT message_id, file_path FROM tracked_images").fetchall())
+    sha = conn.execute("SELECT sha256 FROM tracked_images WHERE message_id=100").fetchone()[0]
+    conn.close()
+    assert rows[400] is None
+    assert rows[300] == str(orphan)
+    assert sha == hashlib.sha256(b"x" * 10).hexdigest()
+
+    ok.write_bytes(b"y" * 10)
+    counts = verify_archive(db_path, str(base), check_hash=True, workers=2, chunk_size=2)
+    assert counts["missing"] == 0
+    assert counts["orphan"] == 0
+    assert counts["hash_mismatch"] == 1
+
+
+def _make_db(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.executemany(
+        "INSERT INTO tracked_images (message_id, channel_id, created_at, file_path, deleted, file_size) VALUES (?, 42, '2020-01-01', ?, 1, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def _file_paths(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = dict(conn.execute("SELECT message_id, file_path FROM tracked_images").fetchall())
+    conn.close()
+    return rows
+
+
+def test_verify_archive_path_mismatch(tmp_path):
+    base = tmp_path / "archive"
+    day = base / "42" / "2020-01-01"
+    day.mkdir(parents=True)
+    (day / "100_1_a.png").write_bytes(b"x" * 10)
+    (day / "200_2_b.png").write_bytes(b"x" * 20)
+    link = tmp_path / "archive-link"
+    link.symlink_to(base)
+
+    db_path = str(tmp_path / "image_tracker_paths.db")
+    _make_db(db_path, [
+        # written through a symlinked root
+        (100, str(link / "42" / "2020-01-01" / "100_1_a.png"), 10),
+        # written inside a container with a different mount point
+        (200, "/app/archive/42/2020-01-01/200_2_b.png", 20),
+    ])
+
+    counts = verify_archive(db_path, str(base), fix=True, workers=2)
+    assert counts["missing"] == 0
+    assert counts["path_mismatch"] == 2
+    assert counts["missing_cleared"] == 0
+    assert _file_paths(db_path)[100] is not None
+    assert _file_paths(db_path)[200] is not None
+
+
+def test_verify_archive_refuses_mass_clear(tmp_path):
+    base = tmp_path / "archive"
+    base.mkdir()
+    db_path = str(tmp_path / "image_tracker_refuse.db")
+    _make_db(db_path, [
+        (100, "/elsewhere/42/2020-01-01/100_1_a.png", 10),
+        (200, "/elsewhere/42/2020-01-01/200_2_b.png", 20),
+    ])
+
+    counts = verify_archive(db_path, str(base), fix=True, workers=2)
+    assert counts["missing"] == 2
+    assert counts["missing_fix_refused"] == 2
+    assert counts["missing_cleared"] == 0
+    assert all(path is not None for path in _file_paths(db_path).values())
+
+
+def test_iter_archive_files_backpressure(tmp_path, monkeypatch):
+    base = tmp_path / "archive"
+    base.mkdir()
+    (base / "root.bin").write_bytes(b"x")
+    for i in range(60):
+        d = base / f"d{i}"
+        d.mkdir()
+        (d / "f.bin").write_bytes(b"x")
+
+    lock = threading.Lock()
+    state = {"alive": 0, "peak": 0}
+    real_scan_dir = verify_archive_module._scan_dir
+
+    def _counting_scan_dir(path):
+        result = real_scan_dir(path)
+        with lock:
+            state["alive"] += 1
+            state["peak"] = max(state["peak"], state["alive"])
+        return result
+
+    monkeypatch.setattr(verify_archive_module, "_scan_dir", _counting_scan_dir)
+
+    seen = 0
+    for files in iter_archive_files(str(base), workers=2):
+        # every directory holds one file, so each listing is yielded exactly once
+        with lock:
+            state["alive"] -= 1
+        seen += len(files)
+        time.sleep(0.005)
+
+    assert seen == 61
+    assert state["peak"] <= 2 * 2
+
+
+def test_verify_archive_report_only_leaves_schema(tmp_path):
+    base = tmp_path / "archive"
+    day = base / "42" / "2020-01-01"
+    day.mkdir(parents=True)
+    (day / "100_1_a.png").write_bytes(b"x" * 10)
+
+    # tracked_images as created before file_size/sha256 were added
+    db_path = str(tmp_path / "image_tracker_legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE tracked_images (message_id INTEGER PRIMARY KEY, channel_id INTEGER,"
+        " created_at TEXT, file_path TEXT, deleted INTEGER DEFAULT 0)"
+    )
+    conn.execute("INSERT INTO tracked_images VALUES (100, 42, '2020-01-01', ?, 1)", (str(day / "100_1_a.png"),))
+    conn.commit()
+    conn.close()
+
+    counts = verify_archive(db_path, str(base), check_hash=True, workers=2)
+    assert counts["rows_checked"] == 1
+    assert counts["missing"] == 0
+
+    conn = sqlite3.connect(db_path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tracked_images)")}
+    conn.close()
+    assert "file_size" not in columns
+    assert "sha256" not in columns
@@ -0,0 +1,376 @@
+"""Offline integrity check for the image archive.
+
+Reconciles the ``tracked_images`` table with the files under ``ARCHIVE_FOLDER``:
+
+- missing files: rows whose ``file_path`` no longer exists on disk
+- orphan files: archive files whose message ID has no row (e.g. a failed insert)
+- size mismatches: files whose size differs from the recorded ``file_size``
+- hash mismatches (``--hash``): files whose SHA-256 differs from the recorded ``sha256``
+
+The archive is walked with ``os.scandir`` across a thread pool and the results are
+spooled into a disk-backed SQLite temp table, so memory stays bounded regardless of
+archive size. The database is then streamed in chunks and, with ``--fix``, repairs
+are written one chunk at a time.
+
+Usage:
+    python verify_archive.py [--fix] [--hash] [--workers N] [--chunk-size N]
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+from config import DATABASE_FILE, ARCHIVE_FOLDER
+from database import TRACKED_IMAGES_ADDED_COLUMNS
+from logging_config import setup_logging
+
+_logger = logging.getLogger(__name__)
+
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_ARCHIVED_NAME_RE = re.compile(r"^(\d+)_")
+_HASH_BLOCK_SIZE = 1024 * 1024
+_PARTIAL_SUFFIX = ".part"
+_PATH_SEP_RE = re.compile(r"[\\/]")
+
+# --fix will not clear missing paths when more than this share of rows look missing;
+# that usually means the database paths and --archive disagree, not lost files.
+MAX_MISSING_FIX_RATIO = 0.5
+
+CREATE_SCAN_TABLE_SQL = """
+CREATE TEMP TABLE archive_scan (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    message_id INTEGER,
+    channel_id INTEGER,
+    day TEXT
+);
+"""
+
+# Issue kinds counted in the result; anything else is a repair or informational count.
+ISSUE_KINDS = ("missing", "orphan", "unrecognised", "size_mismatch", "hash_mismatch")
+
+
+def _scan_dir(path: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """Return ([(file_path, size), ...], [subdir, ...]) for a single directory."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+                except FileNotFoundError:
+                    continue
+    except FileNotFoundError:
+        pass
+    except OSError:
+        _logger.exception("Failed to scan directory %s", path)
+    return files, subdirs
+
+
+def iter_archive_files(base_path: str, workers: int = 8, max_pending: Optional[int] = None) -> Iterator[List[Tuple[str, int]]]:
+    """Yield lists of (file_path, size) for every file under base_path, one list per directory.
+
+    Directories are scanned concurrently, but at most max_pending (default
+    2 * workers) scans are submitted or finished-but-unconsumed at any time, so a
+    slow consumer holds back the scan instead of letting listings pile up in memory.
+    Directories still to scan are queued by path only.
+    """
+    max_pending = max_pending or 2 * workers
+    todo = deque([base_path])
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while todo or pending:
+            while todo and len(pending) < max_pending:
+                pending.add(pool.submit(_scan_dir, todo.popleft()))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                files, subdirs = fut.result()
+                todo.extend(subdirs)
+                if files:
+                    yield files
+
+
+def parse_archive_path(base_path: str, file_path: str) -> Tuple[Optional[int], Optional[int], Optional[str]]:
+    """Return (message_id, channel_id, day) for an ``<channel>/<YYYY-MM-DD>/<message>_...`` path.
+
+    Returns (None, None, None) for files that do not follow the archive layout,
+    including ``.part`` files left behind by interrupted downloads.
+    """
+    parts = os.path.relpath(file_path, base_path).split(os.sep)
+    if len(parts) != 3 or not parts[0].isdigit() or not _DAY_RE.match(parts[1]):
+        return None, None, None
+    if parts[2].endswith(_PARTIAL_SUFFIX):
+        return None, None, None
+    match = _ARCHIVED_NAME_RE.match(parts[2])
+    if not match:
+        return None, None, None
+    return int(match.group(1)), int(parts[0]), parts[1]
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """Return the hex SHA-256 of a file, or None if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(_HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _tracked_columns(conn: sqlite3.Connection) -> set:
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(tracked_images)")}
+    if not existing:
+        raise RuntimeError("tracked_images table not found; run the bot once to initialize the database")
+    return existing
+
+
+def _ensure_columns(conn: sqlite3.Connection) -> set:
+    existing = _tracked_columns(conn)
+    for name, col_type in TRACKED_IMAGES_ADDED_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE tracked_images ADD COLUMN {name} {col_type}")
+            existing.add(name)
+    conn.commit()
+    return existing
+
+
+def _report(counts: Counter, kind: str, max_report: int, msg: str, *args) -> None:
+    counts[kind] += 1
+    if counts[kind] <= max_report:
+        _logger.warning(msg, *args)
+    elif counts[kind] == max_report + 1:
+        _logger.warning("Further %s entries are counted but not logged", kind)
+
+
+def _load_scan(conn: sqlite3.Connection, archive_path: str, workers: int, counts: Counter) -> None:
+    conn.execute(CREATE_SCAN_TABLE_SQL)
+    for files in iter_archive_files(archive_path, workers):
+        rows = []
+        for path, size in files:
+            message_id, channel_id, day = parse_archive_path(archive_path, path)
+            rows.append((path, size, message_id, channel_id, day))
+        conn.executemany("INSERT OR IGNORE INTO temp.archive_scan VALUES (?, ?, ?, ?, ?)", rows)
+        counts["files_scanned"] += len(rows)
+    conn.commit()
+
+
+def _locate(conn: sqlite3.Connection, archive_path: str, file_path: str) -> Tuple[Optional[str], Optional[int]]:
+    """Find a tracked file whose stored path did not match the scan literally.
+
+    Tries the stored path itself (symlinked roots, paths outside the scanned tree),
+    then the same ``<channel>/<day>/<name>`` under archive_path (e.g. a database
+    written inside Docker checked from the host). Returns (path, size) or (None, None).
+    """
+    try:
+        return file_path, os.stat(file_path).st_size
+    except OSError:
+        pass
+    parts = _PATH_SEP_RE.split(file_path)
+    if len(parts) >= 3:
+        candidate = os.path.join(archive_path, *parts[-3:])
+        row = conn.execute("SELECT size FROM temp.archive_scan WHERE path=?", (candidate,)).fetchone()
+        if row:
+            return candidate, row[0]
+    return None, None
+
+
+def _iter_unmatched(conn, chunk_size):
+    """Yield chunks of (message_id, file_path) for rows whose path is not in the scan."""
+    last_id = -1
+    while True:
+        rows = conn.execute(
+            "SELECT t.message_id, t.file_path"
+            " FROM tracked_images t LEFT JOIN temp.archive_scan s ON s.path = t.file_path"
+            " WHERE t.message_id > ? AND t.file_path IS NOT NULL AND s.path IS NULL"
+            " ORDER BY t.message_id LIMIT ?",
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def _clear_missing(conn, archive_path, chunk_size, counts) -> None:
+    # Keep the row (it still records that the message was archived) but drop the dead path.
+    for rows in _iter_unmatched(conn, chunk_size):
+        missing = [(message_id,) for message_id, file_path in rows if _locate(conn, archive_path, file_path)[0] is None]
+        conn.executemany("UPDATE tracked_images SET file_path=NULL WHERE message_id=?", missing)
+        conn.commit()
+        counts["missing_cleared"] += len(missing)
+
+
+def _check_tracked(conn, pool, archive_path, columns, fix, check_hash, chunk_size, max_report, counts) -> None:
+    # databases from before file_size/sha256 existed are read as if every value were NULL
+    file_size_col = "t.file_size" if "file_size" in columns else "NULL"
+    sha256_col = "t.sha256" if "sha256" in columns else "NULL"
+    last_id = -1
+    while True:
+        rows = conn.execute(
+            f"SELECT t.message_id, t.file_path, {file_size_col}, {sha256_col}, s.size"
+            " FROM tracked_images t LEFT JOIN temp.archive_scan s ON s.path = t.file_path"
+            " WHERE t.message_id > ? AND t.file_path IS NOT NULL"
+            " ORDER BY t.message_id LIMIT ?",
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        counts["rows_checked"] += len(rows)
+
+        sizes = []
+        present = []
+        for message_id, file_path, file_size, sha256, disk_size in rows:
+            if disk_size is None:
+                located, disk_size = _locate(conn, archive_path, file_path)
+                if located is None:
+                    _report(counts, "missing", max_report, "Missing file for message %s: %s", message_id, file_path)
+                    continue
+                counts["path_mismatch"] += 1
+                file_path = located
+            if file_size is None:
+                sizes.append((disk_size, message_id))
+            elif file_size != disk_size:
+                _report(
+                    counts, "size_mismatch", max_report,
+                    "Size mismatch for message %s: recorded %d, on disk %d (%s)",
+                    message_id, file_size, disk_size, file_path,
+                )
+            if check_hash:
+                present.append((message_id, file_path, sha256))
+
+        hashes = []
+        if present:
+            for (message_id, file_path, sha256), digest in zip(present, pool.map(file_sha256, [p[1] for p in present])):
+                if digest is None:
+                    continue
+                if sha256 is None:
+                    hashes.append((digest, message_id))
+                elif sha256 != digest:
+                    _report(counts, "hash_mismatch", max_report, "Hash mismatch for message %s: %s", message_id, file_path)
+
+        if fix:
+            conn.executemany("UPDATE tracked_images SET file_size=? WHERE message_id=?", sizes)
+            conn.executemany("UPDATE tracked_images SET sha256=? WHERE message_id=?", hashes)
+            conn.commit()
+            counts["size_recorded"] += len(sizes)
+            counts["hash_recorded"] += len(hashes)
+
+
+def _check_orphans(conn, fix, chunk_size, max_report, counts) -> None:
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            "SELECT s.rowid, s.path, s.size, s.message_id, s.channel_id, s.day FROM temp.archive_scan s"
+            " WHERE s.rowid > ? AND (s.message_id IS NULL"
+            " OR NOT EXISTS (SELECT 1 FROM tracked_images t WHERE t.message_id = s.message_id))"
+            " ORDER BY s.rowid LIMIT ?",
+            (last_rowid, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+
+        adopt = []
+        for _, path, size, message_id, channel_id, day in rows:
+            if message_id is None:
+                _report(counts, "unrecognised", max_report, "Unrecognised file in archive: %s", path)
+                continue
+            _report(counts, "orphan", max_report, "Orphan file for message %s: %s", message_id, path)
+            adopt.append((message_id, channel_id, f"{day}T00:00:00+00:00", path, size))
+
+        if fix and adopt:
+            # Orphans are re-registered rather than deleted; the archive copy may be the only one left.
+            conn.executemany(
+                "INSERT OR IGNORE INTO tracked_images (message_id, channel_id, created_at, file_path, deleted, file_size)"
+                " VALUES (?, ?, ?, ?, 0, ?)",
+                adopt,
+            )
+            conn.commit()
+            counts["orphan_adopted"] += len(adopt)
+
+
+def verify_archive(
+    db_path: str,
+    archive_path: str,
+    fix: bool = False,
+    check_hash: bool = False,
+    workers: int = 8,
+    chunk_size: int = 5000,
+    max_report: int = 100,
+) -> Counter:
+    """Reconcile tracked_images with the archive on disk.
+
+    Without fix the database is opened read-only; the scan lives in a temp table.
+
+    Returns a Counter with one entry per issue kind (see ISSUE_KINDS) plus scan and
+    repair totals.
+    """
+    counts = Counter()
+    archive_path = os.path.abspath(archive_path)
+    if fix:
+        conn = sqlite3.connect(db_path)
+    else:
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        conn.execute("PRAGMA temp_store=FILE")
+        columns = _ensure_columns(conn) if fix else _tracked_columns(conn)
+        _load_scan(conn, archive_path, workers, counts)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            _check_tracked(conn, pool, archive_path, columns, fix, check_hash, chunk_size, max_report, counts)
+        if fix and counts["missing"]:
+            if counts["missing"] > counts["rows_checked"] * MAX_MISSING_FIX_RATIO:
+                _logger.error(
+                    "Refusing to clear %d of %d file paths; check that --archive matches the paths in the database",
+                    counts["missing"],
+                    counts["rows_checked"],
+                )
+                counts["missing_fix_refused"] = counts["missing"]
+            else:
+                _clear_missing(conn, archive_path, chunk_size, counts)
+        _check_orphans(conn, fix, chunk_size, max_report, counts)
+    finally:
+        conn.close()
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Verify the image archive against the tracking database.")
+    parser.add_argument("--database", help="SQLite file (default: DATABASE_FILE)")
+    parser.add_argument("--archive", help="archive folder (default: ARCHIVE_FOLDER)")
+    parser.add_argument("--fix", action="store_true", help="clear missing paths, re-register orphans and record sizes/hashes")
+    parser.add_argument("--hash", action="store_true", help="verify (and with --fix, record) SHA-256 of each tracked file")
+    parser.add_argument("--workers", type=int, default=8, help="threads for scanning and hashing")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="database rows per batch")
+    parser.add_argument("--max-report", type=int, default=100, help="log at most this many entries per issue kind")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    counts = verify_archive(
+        args.database or DATABASE_FILE,
+        args.archive or ARCHIVE_FOLDER,
+        fix=args.fix,
+        check_hash=args.hash,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        max_report=args.max_report,
+    )
+    _logger.info("Archive verification finished: %s", ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    return 1 if any(counts[kind] for kind in ISSUE_KINDS) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())